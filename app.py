@@ -1,179 +1,420 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+import numpy as np
 import io
+import os
+import re
+import ast
+import hashlib
+import uuid
 import math
 
 # Set default page config to wide mode
 st.set_page_config(layout="wide")
 
 # --- Core Data Structure ---
-# Using a dictionary for simplicity and direct conversion to DataFrame
+# Options for the trade input widgets, built once at import instead of on every rerun
+STRATEGY_OPTIONS = ('GZ-GZ', 'DZ-DZ', 'SZ-SZ', '3rd wave', '5th wave', 'C wave')
+CE_PE_OPTIONS = ("CE", "PE")
+CRITERIA_OPTIONS = ('MBL break-retest', 'Auto break-retest', 'RBD', 'HBD', 'BAP', 'Consolidation', 'Bullish Pressure', 'Bearish Pressure')
+WAVE_OPTIONS = (1, 2, 3, 4, 5, "A", "B", "C")
+# The data editor shows Current Wave as text; map its labels back to the option values
+_WAVE_BY_LABEL = {str(wave): wave for wave in WAVE_OPTIONS}
+# Arrow needs categories of one type, so Current Wave is shown as categorical labels
+_WAVE_LABEL_DTYPE = pd.CategoricalDtype(list(_WAVE_BY_LABEL))
+
+# Trades are stored as a single DataFrame with these columns and dtypes.
+# A new trade is entered as a dictionary and appended as one row.
+# Text columns with a fixed set of options are categorical, storing small codes per row.
+TRADE_COLUMNS = {
+    "Date": "datetime64[ns]",
+    "Stock/Symbol": "string[pyarrow]",
+    "Strategy": pd.CategoricalDtype(STRATEGY_OPTIONS),
+    "CE/PE": pd.CategoricalDtype(CE_PE_OPTIONS),
+    "Strike Price": "float64",
+    "Expiry Date": "datetime64[ns]",
+    "LTP": "float64",
+    "Lot Size": "float64",
+    "Quantity": "Int64",
+    "Total Quantity": "float64",
+    "Buy Size": "float64",
+    "Notes": "string[pyarrow]",
+    "Image": "string[pyarrow]",
+    "C Level": "Int64",
+    "Criteria": "object",
+    "Current Wave": "object",
+}
+
+# Columns of the trade schema that hold numbers
+NUMERIC_COLUMNS = [col for col, dtype in TRADE_COLUMNS.items() if dtype in ("float64", "Int64")]
+
+# Trade fields entered as text or numbers that are converted to numeric on add
+NUMERIC_INPUT_FIELDS = ("LTP", "Lot Size", "Quantity", "Strike Price")
+
+def conform_trades(df):
+    """Reorders and casts the columns of a DataFrame to the trade schema.
+    Missing columns are added empty and unknown columns are dropped.
+    """
+    return df.reindex(columns=list(TRADE_COLUMNS)).astype(TRADE_COLUMNS)
+
+def empty_trades():
+    """Returns an empty trades DataFrame with the trade schema."""
+    return conform_trades(pd.DataFrame())
+
+# Template for a new trade entry, built once at import. Date is supplied by the widget.
+_DEFAULT_TRADE = {
+    "Date": None,
+    "Stock/Symbol": "",
+    "Strategy": None,
+    "CE/PE": "CE",
+    "Strike Price": None,
+    "Expiry Date": None,
+    "LTP": None,
+    "Lot Size": None,
+    "Quantity": None,
+    "Total Quantity": None,
+    "Buy Size": None,
+    "Notes": "",
+    "Image": None,
+    "C Level": None,
+    "Criteria": [],
+    "Current Wave": None,
+}
+
 def get_default_trade_entry():
-    return {
-        "Date": datetime.now().strftime("%Y-%m-%d"),
-        "Stock/Symbol": "",
-        "Strategy": "",
-        "CE/PE": "CE",
-        "Strike Price": None,
-        "Expiry Date": None,
-        "LTP": None,
-        "Lot Size": None,
-        "Quantity": None,
-        "Total Quantity": None,
-        "Buy Size": None,
-        "Notes": "",
-        "Image": None,
-        "C Level": None,
-        "Criteria": [],
-        "Current Wave": None,
-    }
+    """Returns a copy of the default trade entry, with its own Criteria list."""
+    return {**_DEFAULT_TRADE, "Criteria": []}
 
 # --- Helper Functions ---
 
-def calculate_buy_size(total_quantity, ltp):
-    """Calculates the Buy Size.
+@st.cache_resource
+def _image_store():
+    """Returns the store of uploaded image bytes, keyed by their SHA-256 digest."""
+    return {}
+
+def image_digest(uploaded_file):
+    """Returns the digest a trade stores in place of an uploaded image.
     Args:
-        total_quantity (int): The total quantity.
-        ltp (float): The LTP.
+        uploaded_file (UploadedFile): The uploaded image, or None.
     Returns:
-        float: The Buy Size
+        str: The SHA-256 digest of the image bytes, or None.
     """
-    if total_quantity is not None and ltp is not None:
-        return total_quantity * ltp
-    return None
+    if uploaded_file is None:
+        return None
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
 
-def round_to_nearest_hundred(ltp):
-    """Rounds a number to the nearest hundred.
+def store_image(digest, uploaded_file):
+    """Keeps the bytes of an uploaded image in the image store, under its digest."""
+    _image_store()[digest] = uploaded_file.getvalue()
+
+def get_image(digest):
+    """Returns the stored bytes for an image digest, or None if they are not in the store."""
+    return _image_store().get(digest)
+
+def calculate_derived_columns(df):
+    """Calculates Total Quantity, Buy Size and the default Strike Price for every row at once.
+    Missing inputs propagate as NaN, so no per-row None checks are needed.
+    Args:
+        df (pd.DataFrame): The trades, with numeric LTP, Lot Size, Quantity and Strike Price.
+    Returns:
+        pd.DataFrame: The same DataFrame with the derived columns filled in.
+    """
+    # Work on plain float64 arrays so nullable columns (e.g. Int64 Quantity) skip masked arithmetic
+    ltp = df["LTP"].to_numpy(dtype=float, na_value=np.nan)
+    lot_size = df["Lot Size"].to_numpy(dtype=float, na_value=np.nan)
+    quantity = df["Quantity"].to_numpy(dtype=float, na_value=np.nan)
+    strike_price = df["Strike Price"].to_numpy(dtype=float, na_value=np.nan)
+
+    total_quantity = lot_size * quantity
+    df["Total Quantity"] = total_quantity
+    df["Buy Size"] = total_quantity * ltp
+    df["Strike Price"] = np.where(np.isnan(strike_price), np.round(ltp / 100.0) * 100, strike_price)
+    return df
+
+def _normalize_and_derive(new_trade):
+    """Converts a trade entry's numeric inputs and calculates its derived values.
     Args:
-        ltp (float): The number to round.
+        new_trade (dict): The trade entry from the input widgets.
     Returns:
-        int: The rounded number.
+        pd.DataFrame: The trade as a single row in the trade schema, or None if a
+        numeric input could not be converted or is not finite.
     """
-    if ltp is not None:
-        return int(round(ltp / 100.0) * 100)
-    return None
+    # Convert string inputs to numeric in one pass; empty strings, None and 0 count as not given
+    raw_values = pd.Series({field: new_trade[field] for field in NUMERIC_INPUT_FIELDS}, dtype=object)
+    given = raw_values.astype(bool)
+    numeric_values = pd.to_numeric(raw_values.where(given), errors="coerce")
+    # "inf" and overflowing text like "1e400" parse as infinity, which is not a usable number
+    invalid = (numeric_values.isna() & given) | ~np.isfinite(numeric_values.fillna(0))
+    if invalid.any():
+        return None
+    new_trade.update(numeric_values.astype(object).where(numeric_values.notna(), None))
 
+    # Build the row column-wise, which skips pandas' per-record dict inference,
+    # then derive values with the same calculation as edits and imports
+    new_row = pd.DataFrame({field: [value] for field, value in new_trade.items()})
+    return calculate_derived_columns(conform_trades(new_row))
 
 def add_trade(trades, new_trade):
-    """Adds a new trade to the list, and calculates derived values.
+    """Adds a new trade to the trades DataFrame, and calculates derived values.
+    Returns None, after showing an error, if a numeric input could not be converted.
     """
-    # Convert string inputs to numeric, handling empty strings
-    try:
-        new_trade["LTP"] = float(new_trade["LTP"]) if new_trade["LTP"] else None
-        new_trade["Lot Size"] = float(new_trade["Lot Size"]) if new_trade["Lot Size"] else None
-        new_trade["Quantity"] = int(new_trade["Quantity"]) if new_trade["Quantity"] else None
-        new_trade["Strike Price"] = float(new_trade["Strike Price"]) if new_trade["Strike Price"] else None
-    except ValueError:
+    new_row = _normalize_and_derive(new_trade)
+    if new_row is None:
         st.error("Invalid numeric input. Please enter numbers only for LTP, lot size, quantity and strike price.")
-        return trades
-
-    # Calculate Total Quantity
-    if new_trade["Lot Size"] is not None and new_trade["Quantity"] is not None:
-        new_trade["Total Quantity"] = new_trade["Lot Size"] * new_trade["Quantity"]
-    else:
-        new_trade["Total Quantity"] = None
-
-    # Calculate Buy Size
-    new_trade["Buy Size"] = calculate_buy_size(new_trade["Total Quantity"], new_trade["LTP"])
-
-    # Default Strike Price logic
-    if new_trade["Strike Price"] is None and new_trade["LTP"] is not None:
-        new_trade["Strike Price"] = round_to_nearest_hundred(new_trade["LTP"])
-
-    trades.append(new_trade)
-    return trades
-
-def update_trade(trades, index, updated_trade):
-    """Updates an existing trade in the list, recalculating derived values."""
-    if 0 <= index < len(trades):
-        try:
-            updated_trade["LTP"] = float(updated_trade["LTP"]) if updated_trade["LTP"] else None
-            updated_trade["Lot Size"] = float(updated_trade["Lot Size"]) if updated_trade["Lot Size"] else None
-            updated_trade["Quantity"] = int(updated_trade["Quantity"]) if updated_trade["Quantity"] else None
-            updated_trade["Strike Price"] = float(updated_trade["Strike Price"]) if updated_trade["Strike Price"] else None
-
-        except ValueError:
-            st.error("Invalid numeric input. Please enter numbers only for LTP, lot size, quantity and strike price.")
-            return trades
-
-        # Calculate Total Quantity
-        if updated_trade["Lot Size"] is not None and updated_trade["Quantity"] is not None:
-            updated_trade["Total Quantity"] = updated_trade["Lot Size"] * updated_trade["Quantity"]
-        else:
-            updated_trade["Total Quantity"] = None
+        return None
+    return pd.concat([trades, new_row], ignore_index=True)
 
-        # Calculate Buy Size
-        updated_trade["Buy Size"] = calculate_buy_size(updated_trade["Total Quantity"], updated_trade["LTP"])
+def delete_trades(trades, positions):
+    """Deletes trades by row position, without rebuilding the remaining rows.
+    Args:
+        trades (pd.DataFrame): The trades.
+        positions (list): Row positions of the trades to delete.
+    Returns:
+        pd.DataFrame: The remaining trades.
+    """
+    return trades.drop(index=trades.index[positions]).reset_index(drop=True)
 
-        # Default Strike Price logic
-        if updated_trade["Strike Price"] is None and updated_trade["LTP"] is not None:
-            updated_trade["Strike Price"] = round_to_nearest_hundred(updated_trade["LTP"])
+def apply_trade_edits(trades, edited_df, added_count=0):
+    """Replaces the trades with the rows from the data editor, recalculating derived values.
+    Args:
+        trades (pd.DataFrame): The trades that were shown in the editor.
+        edited_df (pd.DataFrame): The edited rows returned by st.data_editor.
+        added_count (int): Number of rows added in the editor, which come last in edited_df.
+    Returns:
+        pd.DataFrame: The updated trades.
+    """
+    df = edited_df.copy()
+
+    # Images are not editable in the table, carry them over by row index. An added row can
+    # reuse the label of a deleted one, so added rows are cleared by position instead.
+    df["Image"] = trades["Image"].reindex(df.index)
+    if added_count:
+        df.iloc[-added_count:, df.columns.get_loc("Image")] = pd.NA
+
+    df = calculate_derived_columns(df)
+    return conform_trades(df).reset_index(drop=True)
+
+# Rows shown per page of the trades table
+TABLE_PAGE_SIZE = 500
+
+# Numeric columns stay numeric in the table; the frontend formats the visible cells
+_NUMERIC_COLUMN_CONFIG = {
+    col: st.column_config.NumberColumn(col, format="%.2f")
+    for col in ("LTP", "Lot Size", "Quantity", "Total Quantity", "C Level", "Buy Size")
+}
+
+# Column setup for the trades data editor; derived columns are read-only
+_EDITOR_DISABLED_COLUMNS = ("Total Quantity", "Buy Size")
+_EDITOR_COLUMN_CONFIG = {
+    "Date": st.column_config.DateColumn("Date", required=True),
+    "Strategy": st.column_config.SelectboxColumn("Strategy", options=STRATEGY_OPTIONS),
+    "CE/PE": st.column_config.SelectboxColumn("CE/PE", options=CE_PE_OPTIONS),
+    "Strike Price": st.column_config.NumberColumn("Strike Price", step=50),
+    "Expiry Date": st.column_config.DateColumn("Expiry Date"),
+    "C Level": st.column_config.NumberColumn("C Level", min_value=1, max_value=5, step=1),
+    "Criteria": st.column_config.MultiselectColumn("Criteria", options=CRITERIA_OPTIONS),
+    "Current Wave": st.column_config.SelectboxColumn("Current Wave", options=list(_WAVE_BY_LABEL)),
+}
+
+def _wave_labels(waves):
+    """Returns the text labels of Current Wave values, as used by _WAVE_BY_LABEL.
+    Whole numbers read back as floats (e.g. 3.0 from a CSV with blank cells) get the
+    label of the int option; missing values stay missing.
+    """
+    numbers = pd.to_numeric(waves, errors='coerce')
+    whole = (numbers % 1 == 0).fillna(False)
+    labels = waves.astype(object).where(waves.notna()).astype('string')
+    labels[whole] = numbers[whole].astype('int64').astype('string')
+    return labels
+
+def _wave_categories(waves):
+    """Returns Current Wave as a categorical of its labels, for the table and editor.
+    Values that are not a wave option are shown empty.
+    """
+    labels = _wave_labels(waves)
+    return pd.Categorical(labels.where(labels.isin(_WAVE_BY_LABEL)), dtype=_WAVE_LABEL_DTYPE)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _build_display_df(trades_version, page, _trades):
+    """Builds the formatted DataFrame for one page of the trades table.
+    Cached on the trades version and page only, so reruns with unchanged trades skip
+    both hashing the trades and rebuilding the table.
+    """
+    df = _trades.copy()
+    # Dates are stored as datetime64 and only turned into text here, a column at a time
+    df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
+    df['Expiry Date'] = df['Expiry Date'].dt.strftime('%d %b')
+    df['Current Wave'] = _wave_categories(df['Current Wave'])
+
+    # Combine Expiry Date, Strike Price, and CE/PE into a single column.
+    # Only strikes that fit in an int64 are shown as whole numbers; the rest show as N/A
+    strike_price = df['Strike Price']
+    has_strike = np.isfinite(strike_price) & (strike_price.abs() < 2**63)
+    has_expiry_and_strike = (df['Expiry Date'].notna() & has_strike).to_numpy()
+    strike = np.trunc(strike_price.where(has_strike)).astype('Int64').astype('string')
+    combined = df['Expiry Date'] + ' ' + strike + ' ' + df['CE/PE'].astype('string').fillna('')
+    df['Strike Price'] = np.where(has_expiry_and_strike, combined.fillna('N/A').to_numpy(), 'N/A')
+
+    # Select the columns to display
+    columns_to_display = ['Date', 'Stock/Symbol', 'Strategy',  'Strike Price',  'LTP', 'Lot Size', 'Quantity', 'Total Quantity', 'Buy Size', 'Notes', 'Image', 'C Level', 'Criteria', 'Current Wave'] # Removed CE/PE and changed Expiry Display to Strike Price
+    return df[columns_to_display]
+
+@st.fragment
+def display_trades(trades):
+    """Displays the trades in a Streamlit DataFrame, with formatting.
+    Runs as a fragment, so turning the page reruns only the table and not the whole app.
+    """
+    # The table and the empty-state message share one placeholder, so switching
+    # between them replaces a single element
+    slot = st.empty()
+    if not trades.empty:
+        # Long histories are split into pages, so only one page is formatted and sent at a time
+        page = 0
+        page_count = -(-len(trades) // TABLE_PAGE_SIZE)
+        if page_count > 1:
+            page = st.number_input("Page", min_value=1, max_value=page_count, step=1) - 1
+        page_trades = trades.iloc[page * TABLE_PAGE_SIZE:(page + 1) * TABLE_PAGE_SIZE]
+        slot.dataframe(_build_display_df(st.session_state.trades_version, page, page_trades), hide_index=True,
+                       column_config=_NUMERIC_COLUMN_CONFIG)
+    else:
+        slot.write("No trades recorded yet.")
 
-        trades[index] = updated_trade
-    return trades
+# Each user's trades are saved to their own pickle file here, which keeps the dtypes
+SAVED_TRADES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saved_trades")
 
-def delete_trade(trades, index):
-    """Deletes a trade from the list."""
-    if 0 <= index < len(trades):
-        del trades[index]
-    return trades
+def _saved_trades_path(user_key):
+    """Returns the path of the file a user's trades are saved in."""
+    return os.path.join(SAVED_TRADES_DIR, f"{user_key}.pkl")
 
-def display_trades(trades):
-    """Displays the trades in a Streamlit DataFrame, with formatting."""
-    if trades:
-        df = pd.DataFrame(trades)
-
-        # Combine Expiry Date, Strike Price, and CE/PE into a single column
-        if 'Expiry Date' in df.columns and 'Strike Price' in df.columns:
-            df['Strike Price'] = df.apply(
-                lambda row: f"{pd.to_datetime(row['Expiry Date']).strftime('%d %b')} {int(row['Strike Price'])} {row['CE/PE']}"
-                if pd.notnull(row['Expiry Date']) and pd.notnull(row['Strike Price'])
-                else 'N/A', axis=1
-            )
-        else:
-            df['Strike Price'] = 'N/A'
-
-        # Format numeric columns for better readability.
-        for col in ["LTP", "Lot Size", "Quantity", "Total Quantity", "C Level", "Buy Size"]:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: f"{x:.2f}" if pd.notnull(x) else "N/A")
+def load_trades(user_key):
+    """Loads the saved trades for a user.
+    Args:
+        user_key (str): Identifies whose trades to load.
+    Returns:
+        pd.DataFrame: The saved trades, or no trades if nothing was saved yet.
+    """
+    path = _saved_trades_path(user_key)
+    if not os.path.exists(path):
+        return empty_trades()
+    return conform_trades(pd.read_pickle(path))
+
+def save_trades(user_key, trades):
+    """Saves the trades for a user so they survive reloads and server restarts.
+    No trades are saved as no file, so visitors who never add a trade leave nothing on disk.
+    """
+    path = _saved_trades_path(user_key)
+    if trades.empty:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(SAVED_TRADES_DIR, exist_ok=True)
+    # Write to a temporary file first, so an interrupted save keeps the previous trades
+    temp_path = path + ".tmp"
+    trades.to_pickle(temp_path)
+    os.replace(temp_path, path)
+
+def get_user_key():
+    """Returns the key the current browser's trades are saved under.
+    Nothing else identifies a visitor, so a random id is added to the page URL on the
+    first visit; reloading or bookmarking that URL keeps the same trades.
+    """
+    # The key names the user's save file, so only ids in the issued form are accepted
+    if not re.fullmatch(r"[0-9a-f]{32}", st.query_params.get("uid", "")):
+        st.query_params["uid"] = uuid.uuid4().hex
+    return st.query_params["uid"]
+
+def new_trades_version():
+    """Returns a version stamp for the session's trades.
+    Stamps are unique across sessions, since the display cache is shared by all of them.
+    """
+    return uuid.uuid4().hex
 
-        # Select the columns to display
-        columns_to_display = ['Date', 'Stock/Symbol', 'Strategy',  'Strike Price',  'LTP', 'Lot Size', 'Quantity', 'Total Quantity', 'Buy Size', 'Notes', 'Image', 'C Level', 'Criteria', 'Current Wave'] # Removed CE/PE and changed Expiry Display to Strike Price
-        existing_columns = [col for col in columns_to_display if col in df.columns]
-        st.dataframe(df[existing_columns], hide_index=True)
-    else:
-        st.write("No trades recorded yet.")
+def set_trades(trades):
+    """Replaces the session's trades, bumping their version and saving them."""
+    st.session_state.trades = trades
+    st.session_state.trades_version = new_trades_version()
+    save_trades(get_user_key(), trades)
 
 def clear_all_trades():
     """Clears all trades."""
-    st.session_state.trades = []
+    set_trades(empty_trades())
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _build_csv(trades_version, _trades):
+    """Serializes the trades to CSV bytes. Cached on the trades version, like the display table."""
+    # Write bytes straight into a binary buffer, skipping an intermediate str copy and re-encode
+    csv_buffer = io.BytesIO()
+    _trades.to_csv(csv_buffer, index=False)  # index=False to avoid writing the DataFrame index
+    return csv_buffer.getvalue()
 
 def export_to_csv(trades):
     """Exports the trades data to a CSV file."""
-    if trades:
-        df = pd.DataFrame(trades)
-        # Use a string buffer to hold the CSV data in memory
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)  # index=False to avoid writing the DataFrame index
-        csv_content = csv_buffer.getvalue()  # Get the string value from the buffer
-        return csv_content
+    if not trades.empty:
+        return _build_csv(st.session_state.trades_version, trades)
     else:
         return None
 
+def _blank_unknown_options(values, options):
+    """Empties the values that are not one of the options, and names them in a warning toast.
+    Args:
+        values (pd.Series): A column read from an imported file.
+        options: The values the column may hold.
+    Returns:
+        pd.Series: The column with only known options and missing values.
+    """
+    unknown = values.notna() & ~values.isin(options)
+    if unknown.any():
+        names = ", ".join(values[unknown].astype(str).unique())
+        # A toast stays up through the rerun that follows an import, unlike st.warning
+        st.toast(f"Unknown {values.name} values were left empty: {names}", icon="⚠️", duration="infinite")
+    return values.where(~unknown)
+
+def _parse_criteria(text):
+    """Reads back a Criteria list, which CSV export writes as its Python repr (e.g. "['RBD']").
+    Args:
+        text (str): The Criteria cell, or a missing value.
+    Returns:
+        list: The criteria; plain text that is not a list is kept as a single criterion.
+    """
+    if not isinstance(text, str):
+        return []
+    try:
+        criteria = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return [text]
+    return [str(item) for item in criteria] if isinstance(criteria, (list, tuple)) else [text]
+
 def import_from_csv(file):
     """Imports trades data from a CSV file."""
     try:
-        df = pd.read_csv(file)
+        # The pyarrow engine parses the file in multithreaded C++; the columns it returns are NumPy-backed
+        df = pd.read_csv(file, engine='pyarrow')
         # Convert 'Trade Date' to datetime objects, handling potential parsing issues
         df['Date'] = pd.to_datetime(df['Date'], errors='coerce')  # Changed to Date
         # Drop rows where 'Date' is NaT (Not a Time) after conversion
         df.dropna(subset=['Date'], inplace=True)
 
-        # Convert the DataFrame to a list of dictionaries, which is the format used
-        trades = df.to_dict(orient='records')
-        return trades
+        # Parse all numeric columns in bulk; unreadable cells become NaN, then recalculate
+        df = df.reindex(columns=list(TRADE_COLUMNS))
+        df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce')
+        # Infinite values, and fractions in whole-number columns, can't be stored either
+        df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].where(np.isfinite(df[NUMERIC_COLUMNS]))
+        whole_columns = [col for col in NUMERIC_COLUMNS if TRADE_COLUMNS[col] == "Int64"]
+        df[whole_columns] = df[whole_columns].where(df[whole_columns] % 1 == 0)
+        df = calculate_derived_columns(df)
+        # Parse Expiry Date once here too, so a bad cell is left empty instead of failing the import
+        df['Expiry Date'] = pd.to_datetime(df['Expiry Date'], errors='coerce')
+        # The editor and the add form work with Criteria as lists, not their text form
+        df['Criteria'] = df['Criteria'].map(_parse_criteria)
+        # Categorical columns only hold their options, so report any others before the cast
+        for col in ('Strategy', 'CE/PE'):
+            df[col] = _blank_unknown_options(df[col], TRADE_COLUMNS[col].categories)
+        # Waves come back as text or floats (3 is read as 3.0 next to a blank cell); store the options
+        waves = _blank_unknown_options(_wave_labels(df['Current Wave']), _WAVE_BY_LABEL)
+        df['Current Wave'] = waves.astype(object).map(_WAVE_BY_LABEL)
+
+        # Cast to the trade schema, which is the format used
+        return conform_trades(df).reset_index(drop=True)
     except Exception as e:
         st.error(f"Error reading CSV file: {e}")
         return None
@@ -185,91 +426,107 @@ def main():
     
     # Initialize session state
     if "trades" not in st.session_state:
-        st.session_state.trades = []
+        st.session_state.trades = load_trades(get_user_key())
+        st.session_state.trades_version = new_trades_version()
     if 'ce_pe' not in st.session_state:
         st.session_state.ce_pe = "CE"
 
     # --- Sidebar for Adding Trades ---
     st.sidebar.header("Add New Trade")
-    new_trade = get_default_trade_entry()
-
-    # Use columns to organize input fields
-    col1, col2 = st.sidebar.columns(2)
-
-    new_trade["Date"] = col1.date_input("Date", datetime.now())
-    new_trade["Stock/Symbol"] = col1.text_input("Stock/Symbol").upper()
-    strategy_options = ['GZ-GZ', 'DZ-DZ', 'SZ-SZ', '3rd wave', '5th wave', 'C wave']
-    new_trade["Strategy"] = col1.selectbox("Strategy", options=strategy_options)
-    new_trade["CE/PE"] = col1.radio("CE/PE", options=["CE", "PE"], index=0)
-    new_trade["Strike Price"] = col1.number_input("Strike Price", step=50, value=0)
-    new_trade["Expiry Date"] = col1.date_input("Expiry Date")
-    new_trade["LTP"] = col1.text_input("LTP", value="")
-    new_trade["Lot Size"] = col2.number_input("Lot Size", value=0)
-    new_trade["Quantity"] = col2.number_input("Quantity", value=1, step=1)
-    new_trade["C Level"] = col2.number_input("C Level", min_value=1, max_value=5, step=1, value=1)
-    criteria_options = ['MBL break-retest', 'Auto break-retest', 'RBD', 'HBD', 'BAP', 'Consolidation', 'Bullish Pressure', 'Bearish Pressure']
-    new_trade["Criteria"] = col2.multiselect("Criteria", options=criteria_options)
-    new_trade["Current Wave"] = col2.selectbox("Current Wave", options=[1, 2, 3, 4, 5, "A", "B", "C"])
-    new_trade["Notes"] = st.sidebar.text_area("Notes", height=100)
-    new_trade["Image"] = st.sidebar.file_uploader("Upload Image", type=["png", "jpg", "jpeg"])
-
-    if st.sidebar.button("Add Trade"):
-        st.session_state.trades = add_trade(st.session_state.trades, new_trade)
-        st.success("Trade added!")
+    # Widget values are collected here and only turned into a trade entry on submit
+    trade_inputs = {}
+
+    # Inputs are batched in a form, so only submitting it reruns the app. The inputs are
+    # kept after submitting, so a rejected entry can be corrected instead of retyped.
+    with st.sidebar.form("add_trade_form"):
+        # Use columns to organize input fields
+        col1, col2 = st.columns(2)
+
+        trade_inputs["Date"] = col1.date_input("Date")
+        trade_inputs["Stock/Symbol"] = col1.text_input("Stock/Symbol").upper()
+        trade_inputs["Strategy"] = col1.selectbox("Strategy", options=STRATEGY_OPTIONS)
+        trade_inputs["CE/PE"] = col1.radio("CE/PE", options=CE_PE_OPTIONS, index=0)
+        trade_inputs["Strike Price"] = col1.number_input("Strike Price", step=50, value=0)
+        trade_inputs["Expiry Date"] = col1.date_input("Expiry Date")
+        trade_inputs["LTP"] = col1.text_input("LTP", value="")
+        trade_inputs["Lot Size"] = col2.number_input("Lot Size", value=0)
+        trade_inputs["Quantity"] = col2.number_input("Quantity", value=1, step=1)
+        trade_inputs["C Level"] = col2.number_input("C Level", min_value=1, max_value=5, step=1, value=1)
+        trade_inputs["Criteria"] = col2.multiselect("Criteria", options=CRITERIA_OPTIONS)
+        trade_inputs["Current Wave"] = col2.selectbox("Current Wave", options=WAVE_OPTIONS)
+        trade_inputs["Notes"] = st.text_area("Notes", height=100)
+        trade_inputs["Image"] = st.file_uploader("Upload Image", type=["png", "jpg", "jpeg"])
+
+        submitted = st.form_submit_button("Add Trade")
+
+    if submitted:
+        new_trade = get_default_trade_entry()
+        new_trade.update(trade_inputs)
+        uploaded_image = new_trade["Image"]
+        new_trade["Image"] = image_digest(uploaded_image)
+        trades = add_trade(st.session_state.trades, new_trade)
+        # Images are only kept for trades that were added, as the store is never emptied
+        if trades is not None:
+            if uploaded_image is not None:
+                store_image(new_trade["Image"], uploaded_image)
+            set_trades(trades)
+            st.success("Trade added!")
 
     # --- Main Area: Display and Edit Trades ---
     display_trades(st.session_state.trades)
 
-    # Add an "Edit" button for each trade in the DataFrame
-    if st.session_state.trades:
+    # Show an attached image from the store, for one trade at a time
+    image_digests = st.session_state.trades["Image"].dropna()
+    if not image_digests.empty:
+        # The tables hide the index, so label each choice with its table position, date and symbol
+        image_trades = st.session_state.trades.loc[image_digests.index]
+        image_labels = ((image_digests.index + 1).astype(str) + ". "
+                        + image_trades["Date"].dt.strftime('%Y-%m-%d').fillna('')
+                        + " " + image_trades["Stock/Symbol"].fillna(''))
+        image_index = st.selectbox("Show image for trade", options=image_digests.index,
+                                   format_func=image_labels.get)
+        image_bytes = get_image(image_digests[image_index])
+        if image_bytes is not None:
+            st.image(image_bytes)
+        else:
+            st.info("This image is no longer available.")
+
+    # Edit trades in place; select rows and press delete to remove them
+    if not st.session_state.trades.empty:
         st.header("Edit/Delete Trades")
-        index_to_edit = st.number_input("Enter index of trade to edit/delete (starting from 0):",
-                                        min_value=0, max_value=len(st.session_state.trades) - 1, step=1)
+        editor_df = st.session_state.trades.drop(columns=["Image"])
+        # Current Wave mixes numbers and letters, so the editor works with its labels
+        editor_df["Current Wave"] = _wave_categories(editor_df["Current Wave"])
+        # Cell edits are batched in a form and applied together on save
+        with st.form("edit_form"):
+            edited_df = st.data_editor(
+                editor_df,
+                key="trades_editor",
+                num_rows="dynamic",
+                hide_index=True,
+                disabled=_EDITOR_DISABLED_COLUMNS,
+                column_config=_EDITOR_COLUMN_CONFIG,
+            )
+            save_edits = st.form_submit_button("Save Changes")
 
-        col1, col2 = st.columns(2)
-        if col1.button("Edit Trade"):
-            if 0 <= index_to_edit < len(st.session_state.trades):
-                edited_trade = get_default_trade_entry()
-                trade_to_edit = st.session_state.trades[index_to_edit]
-
-                # Populate the input fields with the existing trade data
-                edited_trade["Date"] = col1.date_input("Date", pd.to_datetime(trade_to_edit["Date"]))
-                edited_trade["Stock/Symbol"] = col1.text_input("Stock/Symbol", value=trade_to_edit["Stock/Symbol"])
-                edited_trade["Strategy"] = col1.selectbox("Strategy", options=strategy_options,
-                                                          index=strategy_options.index(edited_trade["Strategy"]))
-                edited_trade["CE/PE"] = col1.radio("CE/PE", options=["CE", "PE"],
-                                                    index=["CE", "PE"].index(edited_trade["CE/PE"]))
-                edited_trade["Strike Price"] = col1.number_input("Strike Price", step=50,
-                                                                value=edited_trade["Strike Price"])
-                edited_trade["Expiry Date"] = col1.date_input("Expiry Date",
-                                                             value=pd.to_datetime(edited_trade["Expiry Date"]))
-                edited_trade["LTP"] = col1.text_input("LTP", value=edited_trade["LTP"])
-                edited_trade["Lot Size"] = col2.number_input("Lot Size", value=trade_to_size["Lot Size"])
-                edited_trade["Quantity"] = col2.number_input("Quantity", value=edited_trade["Quantity"], step=1)
-                edited_trade["C Level"] = col2.number_input("C Level", min_value=1, max_value=5,
-                                                            value=edited_trade["C Level"])
-                edited_trade["Criteria"] = col2.multiselect("Criteria", options=criteria_options,
-                                                            default=edited_trade["Criteria"])
-                edited_trade["Current Wave"] = col2.selectbox("Current Wave", options=[1, 2, 3, 4, 5, "A", "B", "C"],
-                                                             index=[1, 2, 3, 4, 5, "A", "B", "C"].index(
-                                                                 edited_trade["Current Wave"]))
-                edited_trade["Notes"] = st.text_area("Notes", value=edited_trade["Notes"], height=100)
-                edited_trade["Image"] = st.file_uploader("Upload Image", type=["png", "jpg", "jpeg"])
-
-                st.session_state.trades = update_trade(st.session_state.trades, index_to_edit, edited_trade)
-                st.success("Trade updated!")
+        if save_edits and not edited_df.equals(editor_df):
+            changes = st.session_state["trades_editor"]
+            if changes["edited_rows"] or changes["added_rows"]:
+                edited_df["Current Wave"] = edited_df["Current Wave"].map(_WAVE_BY_LABEL)
+                set_trades(apply_trade_edits(st.session_state.trades, edited_df, len(changes["added_rows"])))
             else:
-                st.error("Invalid index. Please enter a valid index to edit.")
-
-        if col2.button("Delete Trade"):
-            st.session_state.trades = delete_trade(st.session_state.trades, index_to_edit)
-            st.success("Trade deleted!")
+                # Only rows were deleted, so nothing needs recalculating
+                set_trades(delete_trades(st.session_state.trades, changes["deleted_rows"]))
+            # Reset the editor so its pending changes are not applied a second time
+            del st.session_state["trades_editor"]
+            st.rerun()
 
     # Add a button to clear all trades
     if st.button("Clear All Trades"):
         clear_all_trades()
-        st.warning("All trades cleared!")
-        display_trades(st.session_state.trades)
+        # The rerun redraws the table; the toast carries the message across it
+        st.toast("All trades cleared!")
+        st.rerun()
 
     # Add buttons for exporting and importing data
     col1, col2 = st.columns(2)
@@ -283,12 +540,14 @@ def main():
         )
 
     uploaded_file = col2.file_uploader("Import from CSV", type="csv")
-    if uploaded_file is not None:
+    # The uploader keeps its file across reruns, so only import a file once
+    if uploaded_file is not None and uploaded_file.file_id != st.session_state.get("imported_file_id"):
+        st.session_state.imported_file_id = uploaded_file.file_id
         imported_trades = import_from_csv(uploaded_file)
-        if imported_trades:
-            st.session_state.trades = imported_trades
-            st.success("Data imported successfully!")
-            display_trades(st.session_state.trades)
+        if imported_trades is not None:
+            set_trades(imported_trades)
+            st.toast("Data imported successfully!")
+            st.rerun()
         else:
             st.error("Failed to import data from CSV.")
 